@@ -1,6 +1,7 @@
 #!/usr/bin/env -S uv run --script
 # /// script
 # requires-python = ">=3.11"
+# dependencies = ["aiohttp", "orjson"]
 # ///
 from __future__ import annotations
 
@@ -8,39 +9,76 @@ from __future__ import annotations
   ./ado_failed_pipelines.py
   ./ado_failed_pipelines.py --pr-id 12345
   ./ado_failed_pipelines.py --verbose
+  ./ado_failed_pipelines.py --fetch-logs none
+  ./ado_failed_pipelines.py --fetch-logs 'only=^CI$'
 
 Behavior:
   - Infers org/project/repo from `origin` remote.
+  - Talks to the ADO REST API with `AZURE_DEVOPS_EXT_PAT` or an `az` access token;
+    falls back to `az devops invoke`.
   - Default `--pr-id` comes from current branch's matching PR.
   - Queries failed pipeline runs for the PR merge ref; falls back to PR source ref.
   - Emits JSON with one failure per pipeline, plus log path/lines.
+  - `--fetch-logs none|only=PATTERN` skips log downloads and emits a command to fetch them later.
 """
 
 import argparse
 import asyncio
+import base64
+import contextlib
+import hashlib
 import json
+import os
+import re
+import shlex
+import shutil
 import subprocess
 import tempfile
-import shutil
+import time
+from collections.abc import AsyncIterator
 from pathlib import Path
-from urllib.parse import urlparse
+from urllib.parse import quote, urlparse
+
+import aiohttp
+from orjson import loads
 
 
 VERBOSE = False
+ADO_RESOURCE_ID = "499b84ac-1321-427f-aa17-267ca6975798"
+ADO_API_VERSION = "7.1"
+AZ_TOKEN_CMD = ["az", "account", "get-access-token", "--resource", ADO_RESOURCE_ID, "-o", "json"]
+REPO_ID_CACHE = Path.home() / ".cache" / "skillpack" / "ado_repo_ids.json"
+REPO_ID_CACHE_TTL = 24 * 60 * 60
+TIMELINE_CACHE_DIR = Path.home() / ".cache" / "skillpack" / "ado-timelines"
+LOG_DIR = Path(tempfile.gettempdir()) / "ado-pipeline-logs"
+LOG_CHUNK_SIZE = 1024 * 1024
+ERROR_PREFIX_RE = re.compile(r"^(?:(?:Script failed with error|Error): \s*)+")
+
+
+class AdoError(Exception):
+    """az/REST failure; raised instead of SystemExit, which escapes gathered tasks."""
 
 
 async def run_capture(cmd: list[str]) -> str:
+    return (await run_capture_bytes(cmd)).decode().strip()
+
+
+async def run_capture_bytes(cmd: list[str]) -> bytes:
     if VERBOSE:
         print(f"$ {' '.join(cmd)}")
     try:
         proc = await asyncio.create_subprocess_exec(
-            *cmd,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
+            *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
         )
-        stdout_b, stderr_b = await proc.communicate()
+        try:
+            stdout_b, stderr_b = await proc.communicate()
+        except asyncio.CancelledError:
+            # Cancelling communicate() leaves the child running; e.g. an unneeded prefetch.
+            proc.kill()
+            await proc.wait()
+            raise
     except Exception as exc:  # pragma: no cover - subprocess failures already handled below
-        raise SystemExit("command failed") from exc
+        raise AdoError("command failed") from exc
     if proc.returncode != 0:
         stdout = stdout_b.decode().strip()
         stderr = stderr_b.decode().strip()
@@ -50,18 +88,14 @@ async def run_capture(cmd: list[str]) -> str:
         if stderr:
             parts.append(stderr)
         detail = "\n".join(parts) if parts else "command failed"
-        raise SystemExit(detail)
-    return stdout_b.decode().strip()
-
-
-async def run_no_output(cmd: list[str]) -> None:
-    await run_capture(cmd)
+        raise AdoError(detail)
+    return stdout_b
 
 
 async def infer_from_remote() -> tuple[str | None, str | None, str | None]:
     try:
         remote = await run_capture(["git", "config", "--get", "remote.origin.url"])
-    except SystemExit:
+    except AdoError:
         return None, None, None
 
     if remote.startswith("git@ssh.dev.azure.com:v3/"):
@@ -103,125 +137,237 @@ def az_org_project_args(org: str | None, project: str | None) -> list[str]:
     return args
 
 
+class AdoClient:
+    """Single REST session for one org/project; `az devops invoke` when no token."""
+
+    def __init__(self, org: str, project: str, use_cache: bool, refresh: bool) -> None:
+        self.org = org.rstrip("/")
+        self.project = project
+        self.read_cache = use_cache and not refresh
+        self.write_cache = use_cache
+        self._session: aiohttp.ClientSession | None = None
+        self._token: str | None = None
+        self._expires = 0.0
+        self._token_lock = asyncio.Lock()
+
+    async def __aenter__(self) -> AdoClient:
+        try:
+            await self._auth_header()
+        except AdoError:
+            if VERBOSE:
+                print("no access token; using az devops invoke")
+            return self
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=32, limit_per_host=16),
+            trust_env=True,
+        )
+        return self
+
+    async def _auth_header(self) -> str:
+        # Same PAT variable the az devops extension reads; skips the az token spawn.
+        pat = os.environ.get("AZURE_DEVOPS_EXT_PAT")
+        if pat:
+            return "Basic " + base64.b64encode(f":{pat}".encode()).decode()
+        async with self._token_lock:
+            if self._token is None or self._expires < time.time() + 60:
+                payload = loads(await run_capture_bytes(AZ_TOKEN_CMD))
+                self._token = payload["accessToken"]
+                # Newer az adds epoch `expires_on`; older builds only have local-time `expiresOn`.
+                self._expires = float(
+                    payload.get("expires_on")
+                    or time.mktime(time.strptime(payload["expiresOn"], "%Y-%m-%d %H:%M:%S.%f"))
+                )
+        return f"Bearer {self._token}"
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        if self._session is not None:
+            await self._session.close()
+
+    def _url(self, path: str) -> str:
+        return f"{self.org}/{quote(self.project)}/_apis/{path}"
+
+    def _scoped_path(self, root: Path, name: str) -> Path:
+        # Run ids are only unique within an org, so key files by host/org/project.
+        parsed = urlparse(self.org)
+        return root / parsed.netloc / parsed.path.strip("/") / self.project / name
+
+    def timeline_cache_path(self, run_id: int) -> Path:
+        return self._scoped_path(TIMELINE_CACHE_DIR, f"{run_id}.json")
+
+    def log_path(self, run_id: int) -> Path:
+        return self._scoped_path(LOG_DIR, f"{run_id}.log")
+
+    def _invoke_cmd(self, area: str, resource: str, route: dict[str, object]) -> list[str]:
+        cmd = ["az", "devops", "invoke", *az_org_project_args(self.org, None)]
+        cmd += ["--area", area, "--resource", resource, "--route-parameters"]
+        return cmd + [f"project={self.project}"] + [f"{k}={v}" for k, v in route.items()]
+
+    @contextlib.asynccontextmanager
+    async def _rest_get(
+        self, path: str, query: dict[str, object] | None, accept: str
+    ) -> AsyncIterator[aiohttp.ClientResponse]:
+        url = self._url(path)
+        if VERBOSE:
+            print(f"GET {url}")
+        params = {"api-version": ADO_API_VERSION, **{k: str(v) for k, v in (query or {}).items()}}
+        headers = {"Authorization": await self._auth_header(), "Accept": accept}
+        try:
+            async with self._session.get(url, params=params, headers=headers) as resp:
+                if resp.status != 200:
+                    detail = (await resp.text()).strip()
+                    raise AdoError(f"GET {url} failed ({resp.status})\n{detail}".strip())
+                # Errors raised while the caller reads the body surface here as well.
+                yield resp
+        except aiohttp.ClientError as exc:
+            raise AdoError(f"GET {url} failed: {exc}") from exc
+
+    async def get_json(
+        self,
+        path: str,
+        area: str,
+        resource: str,
+        route: dict[str, object],
+        query: dict[str, object] | None = None,
+    ) -> dict:
+        if self._session is not None:
+            async with self._rest_get(path, query, "application/json") as resp:
+                return loads(await resp.read())
+        cmd = self._invoke_cmd(area, resource, route)
+        if query:
+            cmd += ["--query-parameters"] + [f"{k}={v}" for k, v in query.items()]
+        return loads(await run_capture_bytes(cmd + ["-o", "json"]))
+
+    async def iter_bytes(
+        self, path: str, area: str, resource: str, route: dict[str, object]
+    ) -> AsyncIterator[bytes]:
+        if self._session is not None:
+            async with self._rest_get(path, None, "text/plain") as resp:
+                async for chunk in resp.content.iter_chunked(LOG_CHUNK_SIZE):
+                    yield chunk
+            return
+        fd, out_name = tempfile.mkstemp(prefix="ado-invoke-")
+        os.close(fd)
+        out_file = Path(out_name)
+        accept = ["--accept-media-type", "text/plain", "--out-file", out_name]
+        try:
+            await run_capture(self._invoke_cmd(area, resource, route) + accept)
+            with out_file.open("rb") as in_f:
+                while chunk := in_f.read(LOG_CHUNK_SIZE):
+                    yield chunk
+        finally:
+            out_file.unlink(missing_ok=True)
+
+
 async def get_branch_ref() -> str:
     branch = await run_capture(["git", "rev-parse", "--abbrev-ref", "HEAD"])
     return f"refs/heads/{branch}"
 
 
-async def find_pr_id(
-    org: str | None,
-    project: str | None,
-    repo: str,
-) -> int:
+async def find_pr_id(client: AdoClient, repo: str) -> int:
     source_ref = await get_branch_ref()
-    cmd = [
-        "az",
-        "repos",
-        "pr",
-        "list",
-    ] + az_org_project_args(org, project) + [
-        "--repository",
-        repo,
-        "--source-branch",
-        source_ref,
-        "--status",
-        "active",
-        "--query",
-        "[0].pullRequestId",
-        "-o",
-        "tsv",
-    ]
-    pr_id = await run_capture(cmd)
-    if pr_id:
-        return int(pr_id)
-    raise SystemExit(f"No PR found for {source_ref}")
-
-
-async def get_repo_id(org: str | None, project: str | None, repo: str) -> str:
-    cmd = [
-        "az",
-        "repos",
-        "show",
-    ] + az_org_project_args(org, project) + [
-        "--repository",
-        repo,
-        "--query",
-        "id",
-        "-o",
-        "tsv",
-    ]
-    return await run_capture(cmd)
-
-
-async def get_pr_source_ref(org: str | None, project: str, repo_id: str, pr_id: int) -> str:
-    cmd = [
-        "az",
-        "devops",
-        "invoke",
-    ] + az_org_project_args(org, None) + [
-        "--area",
+    payload = await client.get_json(
+        f"git/repositories/{quote(repo)}/pullRequests",
+        "git",
+        "pullRequests",
+        {"repositoryId": repo},
+        {"searchCriteria.sourceRefName": source_ref, "searchCriteria.status": "active", "$top": 1},
+    )
+    prs = payload.get("value", [])
+    if prs:
+        return int(prs[0]["pullRequestId"])
+    raise AdoError(f"No PR found for {source_ref}")
+
+
+def write_json_atomic(path: Path, payload: object) -> None:
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(payload))
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+
+def read_repo_id_cache(key: str) -> str | None:
+    try:
+        entries = json.loads(REPO_ID_CACHE.read_text())
+    except (OSError, ValueError):
+        return None
+    entry = entries.get(key) or {}
+    if time.time() - entry.get("cachedAt", 0) > REPO_ID_CACHE_TTL:
+        return None
+    return entry.get("id")
+
+
+def write_repo_id_cache(key: str, repo_id: str) -> None:
+    try:
+        entries = json.loads(REPO_ID_CACHE.read_text())
+    except (OSError, ValueError):
+        entries = {}
+    entries[key] = {"id": repo_id, "cachedAt": time.time()}
+    write_json_atomic(REPO_ID_CACHE, entries)
+
+
+async def get_repo_id(client: AdoClient, repo: str) -> str:
+    key = hashlib.sha1(f"{client.org}|{client.project}|{repo}".encode()).hexdigest()
+    if client.read_cache and (cached := read_repo_id_cache(key)):
+        return cached
+    payload = await client.get_json(
+        f"git/repositories/{quote(repo)}", "git", "repositories", {"repositoryId": repo}
+    )
+    repo_id = payload["id"]
+    if client.write_cache:
+        write_repo_id_cache(key, repo_id)
+    return repo_id
+
+
+async def get_pr_source_ref(client: AdoClient, repo_id: str, pr_id: int) -> str | None:
+    payload = await client.get_json(
+        f"git/repositories/{repo_id}/pullRequests/{pr_id}",
         "git",
-        "--resource",
         "pullRequests",
-        "--route-parameters",
-        f"project={project}",
-        f"repositoryId={repo_id}",
-        f"pullRequestId={pr_id}",
-        "--query",
-        "sourceRefName",
-        "-o",
-        "tsv",
-    ]
-    ref = await run_capture(cmd)
-    if not ref:
-        raise SystemExit(f"No sourceRefName for PR {pr_id}")
-    return ref
-
-
-async def get_failed_runs(
-    org: str | None, project: str, branch_ref: str, reason: str | None
-) -> list[dict]:
-    cmd = [
-        "az",
-        "pipelines",
-        "runs",
-        "list",
-    ] + az_org_project_args(org, project) + [
-        "--branch",
-        branch_ref,
-        "--result",
-        "failed",
-        "--status",
-        "completed",
-        "--top",
-        "50",
-        "-o",
-        "json",
-    ]
+        {"repositoryId": repo_id, "pullRequestId": pr_id},
+    )
+    return payload.get("sourceRefName")
+
+
+async def prefetch_pr_source_ref(client: AdoClient, repo_id: str, pr_id: int) -> str | None:
+    # Speculative: most runs hit the merge ref, so a failure here must not end the script.
+    try:
+        return await get_pr_source_ref(client, repo_id, pr_id)
+    except AdoError:
+        return None
+
+
+async def get_failed_runs(client: AdoClient, branch_ref: str, reason: str | None) -> list[dict]:
+    query: dict[str, object] = {
+        "branchName": branch_ref,
+        "resultFilter": "failed",
+        "statusFilter": "completed",
+        "$top": 50,
+    }
     if reason:
-        cmd += ["--reason", reason]
-    raw = await run_capture(cmd)
-    return json.loads(raw)
-
-
-async def get_run_errors(org: str | None, project: str, run_id: int) -> list[str]:
-    cmd = [
-        "az",
-        "devops",
-        "invoke",
-    ] + az_org_project_args(org, None) + [
-        "--area",
-        "build",
-        "--resource",
-        "timeline",
-        "--route-parameters",
-        f"project={project}",
-        f"buildId={run_id}",
-        "-o",
-        "json",
-    ]
-    raw = await run_capture(cmd)
-    payload = json.loads(raw)
+        query["reasonFilter"] = reason
+    payload = await client.get_json("build/builds", "build", "builds", {}, query)
+    return payload.get("value", [])
+
+
+def read_run_cache(client: AdoClient, run_id: int) -> dict:
+    # Runs come from get_failed_runs with status=completed, so timelines and logs never change.
+    if not client.read_cache:
+        return {}
+    try:
+        return loads(client.timeline_cache_path(run_id).read_bytes())
+    except (OSError, ValueError):
+        return {}
+
+
+async def get_run_errors(client: AdoClient, run_id: int, cached: dict) -> list[str]:
+    if "errors" in cached:
+        return cached["errors"]
+    payload = await client.get_json(
+        f"build/builds/{run_id}/timeline", "build", "timeline", {"buildId": run_id}
+    )
     errors: list[str] = []
     for record in payload.get("records", []):
         for issue in record.get("issues", []) or []:
@@ -232,101 +378,126 @@ async def get_run_errors(org: str | None, project: str, run_id: int) -> list[str
     return errors
 
 
-async def download_run_logs(org: str | None, project: str, run_id: int) -> dict:
-    cmd = [
-        "az",
-        "devops",
-        "invoke",
-    ] + az_org_project_args(org, None) + [
-        "--area",
-        "build",
-        "--resource",
-        "logs",
-        "--route-parameters",
-        f"project={project}",
-        f"buildId={run_id}",
-        "-o",
-        "json",
-    ]
-    raw = await run_capture(cmd)
-    payload = json.loads(raw)
+async def download_run_logs(client: AdoClient, run_id: int, cached: dict) -> dict:
+    final_file = client.log_path(run_id)
+    log_info = cached.get("log") or {}
+    try:
+        # A size mismatch means the file was replaced or truncated since it was cached.
+        if final_file.stat().st_size == log_info.get("logBytes"):
+            return log_info
+    except OSError:
+        pass
+
+    payload = await client.get_json(
+        f"build/builds/{run_id}/logs", "build", "logs", {"buildId": run_id}
+    )
     logs = payload.get("value", [])
     log_ids = sorted([log.get("id") for log in logs if log.get("id")])
-    staging_dir = Path(tempfile.mkdtemp(prefix=f"ado-pipeline-logs-{run_id}-"))
-    final_file = Path(tempfile.gettempdir()) / f"ado-pipeline-logs-{run_id}.log"
-    if final_file.exists():
-        final_file.unlink()
+    final_file.parent.mkdir(parents=True, exist_ok=True)
+    partial_file = final_file.with_name(f"{final_file.name}.{os.getpid()}.partial")
 
+    parts = {log_id: partial_file.with_name(f"{partial_file.name}.{log_id}") for log_id in log_ids}
     semaphore = asyncio.Semaphore(6)
 
-    async def download_one(log_id: int) -> Path:
-        out_file = staging_dir / f"log_{log_id}.txt"
-        if VERBOSE:
-            print(f"download log {log_id} -> {out_file}")
-        cmd = [
-            "az",
-            "devops",
-            "invoke",
-        ] + az_org_project_args(org, None) + [
-            "--area",
-            "build",
-            "--resource",
-            "logs",
-            "--route-parameters",
-            f"project={project}",
-            f"buildId={run_id}",
-            f"logId={log_id}",
-            "--accept-media-type",
-            "text/plain",
-            "--out-file",
-            str(out_file),
-        ]
+    async def download_part(log_id: int) -> int:
+        # Overlapping downloads each stream to their own part file, so no body sits in memory.
         async with semaphore:
-            await run_no_output(cmd)
-        return out_file
-
-    await asyncio.gather(*(download_one(log_id) for log_id in log_ids))
-
-    line_count = 0
-    with final_file.open("wb") as out_f:
-        for log_id in log_ids:
-            src = staging_dir / f"log_{log_id}.txt"
-            with src.open("rb") as in_f:
-                while True:
-                    chunk = in_f.read(1024 * 1024)
-                    if not chunk:
-                        break
+            if VERBOSE:
+                print(f"download log {log_id} -> {final_file}")
+            line_count = 0
+            with parts[log_id].open("wb") as part_f:
+                async for chunk in client.iter_bytes(
+                    f"build/builds/{run_id}/logs/{log_id}",
+                    "build",
+                    "logs",
+                    {"buildId": run_id, "logId": log_id},
+                ):
                     line_count += chunk.count(b"\n")
-                    out_f.write(chunk)
+                    part_f.write(chunk)
+            return line_count
+
+    tasks = [asyncio.create_task(download_part(log_id)) for log_id in log_ids]
+    try:
+        line_count = sum(await asyncio.gather(*tasks))
+        with partial_file.open("wb") as out_f:
+            for log_id in log_ids:
+                with parts[log_id].open("rb") as part_f:
+                    shutil.copyfileobj(part_f, out_f, LOG_CHUNK_SIZE)
+            log_bytes = out_f.tell()
+        os.replace(partial_file, final_file)
+    finally:
+        # On failure, stop sibling downloads before removing their part files.
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for path in [partial_file, *parts.values()]:
+            path.unlink(missing_ok=True)
 
-    shutil.rmtree(staging_dir, ignore_errors=True)
     return {
         "logPath": str(final_file),
         "logLines": line_count,
-        "logBytes": final_file.stat().st_size,
+        "logBytes": log_bytes,
     }
 
 
 def normalize_error(message: str) -> str:
     first = message.splitlines()[0].strip()
-    prefixes = ["Script failed with error: ", "Error: "]
-    changed = True
-    while changed:
-        changed = False
-        for prefix in prefixes:
-            if first.startswith(prefix):
-                first = first[len(prefix) :].strip()
-                changed = True
-    return first
-
-
-def prune_nulls(value: object) -> object:
-    if isinstance(value, dict):
-        cleaned = {k: prune_nulls(v) for k, v in value.items() if v is not None}
-        return {k: v for k, v in cleaned.items() if v is not None}
-    if isinstance(value, list):
-        return [prune_nulls(v) for v in value if v is not None]
-    return value
+    return ERROR_PREFIX_RE.sub("", first)
+
+
+def parse_fetch_logs(value: str) -> re.Pattern[str] | None:
+    if value == "all":
+        return re.compile("")
+    if value == "none":
+        return None
+    if value.startswith("only="):
+        try:
+            return re.compile(value.removeprefix("only="))
+        except re.error as exc:
+            raise argparse.ArgumentTypeError(f"invalid pattern: {exc}") from exc
+    raise argparse.ArgumentTypeError("expected all, none, or only=PATTERN")
+
+
+def fetch_logs_command(pr_id: int, pipeline: str) -> str:
+    args = ["--pr-id", str(pr_id), "--fetch-logs", f"only=^{re.escape(pipeline)}$"]
+    return shlex.join(["uv", "run", "--script", str(Path(__file__).resolve()), *args])
+
+
+async def process_run(
+    client: AdoClient,
+    semaphore: asyncio.Semaphore,
+    pr_id: int,
+    pipeline: str,
+    run: dict,
+    fetch_logs: bool,
+) -> dict:
+    run_id = run["id"]
+    cached = read_run_cache(client, run_id)
+    entry = dict(cached)
+    async with semaphore:
+        if VERBOSE:
+            print(f"fetch errors for run {run_id} ({pipeline})")
+        if fetch_logs:
+            errors, log_info = await asyncio.gather(
+                get_run_errors(client, run_id, cached), download_run_logs(client, run_id, cached)
+            )
+            entry["log"] = log_info
+        else:
+            errors = await get_run_errors(client, run_id, cached)
+            log_info = {
+                "logRunId": run_id,
+                "logProject": client.project,
+                "logOrg": client.org,
+                "fetchLogs": fetch_logs_command(pr_id, pipeline),
+            }
+    # One cache entry per run holds both results, so it is written once here.
+    entry["errors"] = errors
+    if client.write_cache and entry != cached:
+        write_json_atomic(client.timeline_cache_path(run_id), entry)
+    item = {"pipeline": pipeline, "runId": run_id}
+    if errors:
+        item["error"] = normalize_error(errors[0])
+    return {**item, **log_info}
 
 
 async def main() -> int:
@@ -335,6 +506,17 @@ async def main() -> int:
     )
     parser.add_argument("--pr-id", type=int, help="PR id. If omitted, use current branch.")
     parser.add_argument("--verbose", action="store_true", help="Show commands and progress.")
+    parser.add_argument("--no-cache", action="store_true", help="Skip on-disk caches.")
+    parser.add_argument(
+        "--refresh", action="store_true", help="Re-fetch cached repo id, timelines, and logs."
+    )
+    parser.add_argument(
+        "--fetch-logs",
+        type=parse_fetch_logs,
+        default="all",
+        metavar="{all,none,only=PATTERN}",
+        help="Which pipelines to download logs for (PATTERN is a regex on the pipeline name).",
+    )
     args = parser.parse_args()
 
     global VERBOSE
@@ -344,48 +526,48 @@ async def main() -> int:
     if not org or not project or not repo:
         raise SystemExit("Missing org/project/repo. Set origin remote.")
 
-    repo_id = await get_repo_id(org, project, repo)
-    pr_id = args.pr_id or await find_pr_id(org, project, repo)
-    branch_ref = f"refs/pull/{pr_id}/merge"
-    runs = await get_failed_runs(org, project, branch_ref, "pullRequest")
-    if not runs:
-        branch_ref = await get_pr_source_ref(org, project, repo_id, pr_id)
-        runs = await get_failed_runs(org, project, branch_ref, "pullRequest")
-
-    items = []
-    seen_pipelines: set[str] = set()
-    for run in sorted(runs, key=lambda r: r.get("id", 0), reverse=True):
-        run_id = run.get("id")
-        if not run_id:
-            continue
-        pipeline = (run.get("definition") or {}).get("name")
-        if not pipeline or pipeline in seen_pipelines:
-            continue
-        if VERBOSE:
-            print(f"fetch errors for run {run_id} ({pipeline})")
-        errors = await get_run_errors(org, project, run_id)
-        if VERBOSE:
-            print(f"download logs for run {run_id} ({pipeline})")
-        log_info = await download_run_logs(org, project, run_id)
-        summary = None
-        if errors:
-            summary = normalize_error(errors[0])
-        items.append(
-            {
-                "pipeline": pipeline,
-                "runId": run_id,
-                "error": summary,
-                "logPath": log_info.get("logPath"),
-                "logLines": log_info.get("logLines"),
-                "logBytes": log_info.get("logBytes"),
-            }
-        )
-        seen_pipelines.add(pipeline)
+    async with AdoClient(org, project, not args.no_cache, args.refresh) as client:
+        if args.pr_id:
+            repo_id = await get_repo_id(client, repo)
+            pr_id = args.pr_id
+        else:
+            repo_id, pr_id = await asyncio.gather(
+                get_repo_id(client, repo), find_pr_id(client, repo)
+            )
+        # Resolve the source ref alongside the merge-ref query so the fallback costs no extra wait.
+        source_ref_task = asyncio.create_task(prefetch_pr_source_ref(client, repo_id, pr_id))
+        runs = await get_failed_runs(client, f"refs/pull/{pr_id}/merge", "pullRequest")
+        if runs:
+            source_ref_task.cancel()
+        else:
+            # Retry in the foreground if the prefetch failed so its error is reported.
+            source_ref = await source_ref_task or await get_pr_source_ref(client, repo_id, pr_id)
+            if not source_ref:
+                raise SystemExit(f"No sourceRefName for PR {pr_id}")
+            runs = await get_failed_runs(client, source_ref, "pullRequest")
+
+        unique: dict[str, dict] = {}
+        for run in sorted(runs, key=lambda r: r.get("id", 0), reverse=True):
+            pipeline = (run.get("definition") or {}).get("name")
+            if pipeline and pipeline not in unique and run.get("id"):
+                unique[pipeline] = run
+
+        semaphore = asyncio.Semaphore(4)
+        pattern = args.fetch_logs
+        jobs = [
+            process_run(client, semaphore, pr_id, name, run, bool(pattern and pattern.search(name)))
+            for name, run in unique.items()
+        ]
+        items = await asyncio.gather(*jobs)
 
     output = {"prId": pr_id, "failures": items}
-    print(json.dumps(prune_nulls(output), indent=2))
+    print(json.dumps(output, indent=2))
     return 0
 
 
 if __name__ == "__main__":
-    raise SystemExit(asyncio.run(main()))
+    try:
+        raise SystemExit(asyncio.run(main()))
+    except AdoError as exc:
+        # asyncio.run has cancelled the remaining tasks, so this is the only error printed.
+        raise SystemExit(str(exc)) from None
@@ -1,6 +1,7 @@
 #!/usr/bin/env -S uv run --script
 # /// script
 # requires-python = ">=3.11"
+# dependencies = ["orjson"]
 # ///
 from __future__ import annotations
 
@@ -11,23 +12,50 @@ from __future__ import annotations
 
 Behavior:
   - Infers org/project/repo from `origin` remote unless flags passed.
+  - Calls the ADO REST API in-process with `AZURE_DEVOPS_EXT_PAT` or an `az` access token;
+    falls back to `az` commands when neither is available.
   - Default `--pr-id` comes from current branch's matching PR.
   - Filters to threads with file/line context; optional `--file` filter.
   - Emits JSON with thread refs and comment metadata.
 """
 
 import argparse
+import base64
+import functools
+import hashlib
 import json
+import os
 import subprocess
-from urllib.parse import urlparse
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import quote, urlencode, urlparse
+
+try:
+    from orjson import loads
+except ImportError:  # pragma: no cover - stdlib fallback when run without uv
+    from json import loads
+
+
+ADO_RESOURCE_ID = "499b84ac-1321-427f-aa17-267ca6975798"
+ADO_API_VERSION = "7.1"
+AZ_TOKEN_CMD = ["az", "account", "get-access-token", "--resource", ADO_RESOURCE_ID, "-o", "json"]
+REPO_ID_CACHE = Path.home() / ".cache" / "skillpack" / "ado_repo_ids.json"
+REPO_ID_CACHE_TTL = 24 * 60 * 60
 
 
 def run(cmd: list[str]) -> str:
+    return run_bytes(cmd).decode().strip()
+
+
+def run_bytes(cmd: list[str]) -> bytes:
     try:
-        result = subprocess.run(cmd, check=True, capture_output=True, text=True)
+        result = subprocess.run(cmd, check=True, capture_output=True)
     except subprocess.CalledProcessError as exc:
-        stdout = exc.stdout.strip()
-        stderr = exc.stderr.strip()
+        stdout = exc.stdout.decode(errors="replace").strip()
+        stderr = exc.stderr.decode(errors="replace").strip()
         parts = []
         if stdout:
             parts.append(stdout)
@@ -35,7 +63,33 @@ def run(cmd: list[str]) -> str:
             parts.append(stderr)
         detail = "\n".join(parts) if parts else "command failed"
         raise SystemExit(detail) from exc
-    return result.stdout.strip()
+    return result.stdout
+
+
+@functools.cache
+def auth_header() -> str | None:
+    # Same PAT variable the az devops extension reads; skips the az token spawn.
+    pat = os.environ.get("AZURE_DEVOPS_EXT_PAT")
+    if pat:
+        return "Basic " + base64.b64encode(f":{pat}".encode()).decode()
+    try:
+        return f"Bearer {loads(run_bytes(AZ_TOKEN_CMD))['accessToken']}"
+    except SystemExit:
+        return None
+
+
+def rest_get(org: str, project: str, path: str, query: dict[str, str] | None = None) -> dict:
+    params = urlencode({"api-version": ADO_API_VERSION, **(query or {})})
+    url = f"{org.rstrip('/')}/{quote(project)}/_apis/{path}?{params}"
+    request = urllib.request.Request(url, headers={"Authorization": auth_header()})
+    try:
+        with urllib.request.urlopen(request) as resp:
+            return loads(resp.read())
+    except urllib.error.HTTPError as exc:
+        detail = exc.read().decode(errors="replace").strip()
+        raise SystemExit(f"GET {url} failed ({exc.code})\n{detail}".strip()) from exc
+    except urllib.error.URLError as exc:
+        raise SystemExit(f"GET {url} failed: {exc.reason}") from exc
 
 
 def az_org_project_args(org: str | None, project: str | None) -> list[str]:
@@ -47,6 +101,7 @@ def az_org_project_args(org: str | None, project: str | None) -> list[str]:
     return args
 
 
+@functools.cache
 def infer_from_remote() -> tuple[str | None, str | None, str | None]:
     try:
         remote = run(["git", "config", "--get", "remote.origin.url"])
@@ -83,6 +138,7 @@ def infer_from_remote() -> tuple[str | None, str | None, str | None]:
     return None, None, None
 
 
+@functools.cache
 def get_branch() -> str:
     return run(["git", "rev-parse", "--abbrev-ref", "HEAD"])
 
@@ -94,24 +150,34 @@ def find_pr_id(
     status: str,
 ) -> int:
     source_ref = f"refs/heads/{get_branch()}"
-    cmd = [
-        "az",
-        "repos",
-        "pr",
-        "list",
-    ] + az_org_project_args(org, project) + [
-        "--repository",
-        repo,
-        "--source-branch",
-        source_ref,
-        "--status",
-        status,
-        "--query",
-        "[0].pullRequestId",
-        "-o",
-        "tsv",
-    ]
-    pr_id = run(cmd)
+    if auth_header():
+        payload = rest_get(
+            org,
+            project,
+            f"git/repositories/{quote(repo)}/pullRequests",
+            {"searchCriteria.sourceRefName": source_ref, "searchCriteria.status": status},
+        )
+        prs = payload.get("value", [])
+        pr_id = str(prs[0]["pullRequestId"]) if prs else ""
+    else:
+        cmd = [
+            "az",
+            "repos",
+            "pr",
+            "list",
+        ] + az_org_project_args(org, project) + [
+            "--repository",
+            repo,
+            "--source-branch",
+            source_ref,
+            "--status",
+            status,
+            "--query",
+            "[0].pullRequestId",
+            "-o",
+            "tsv",
+        ]
+        pr_id = run(cmd)
     if pr_id:
         return int(pr_id)
     if status != "all":
@@ -119,20 +185,55 @@ def find_pr_id(
     raise SystemExit(f"No PR found for {source_ref}")
 
 
-def get_repo_id(org: str | None, project: str | None, repo: str) -> str:
-    cmd = [
-        "az",
-        "repos",
-        "show",
-    ] + az_org_project_args(org, project) + [
-        "--repository",
-        repo,
-        "--query",
-        "id",
-        "-o",
-        "tsv",
-    ]
-    return run(cmd)
+def read_repo_id_cache(key: str) -> str | None:
+    try:
+        entries = json.loads(REPO_ID_CACHE.read_text())
+    except (OSError, ValueError):
+        return None
+    entry = entries.get(key) or {}
+    if time.time() - entry.get("cachedAt", 0) > REPO_ID_CACHE_TTL:
+        return None
+    return entry.get("id")
+
+
+def write_repo_id_cache(key: str, repo_id: str) -> None:
+    try:
+        entries = json.loads(REPO_ID_CACHE.read_text())
+    except (OSError, ValueError):
+        entries = {}
+    entries[key] = {"id": repo_id, "cachedAt": time.time()}
+    try:
+        REPO_ID_CACHE.parent.mkdir(parents=True, exist_ok=True)
+        tmp = REPO_ID_CACHE.with_name(f"{REPO_ID_CACHE.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(entries))
+        os.replace(tmp, REPO_ID_CACHE)
+    except OSError:
+        pass
+
+
+def get_repo_id(org: str | None, project: str | None, repo: str, use_cache: bool) -> str:
+    key = hashlib.sha1(f"{org}|{project}|{repo}".encode()).hexdigest()
+    if use_cache and (cached := read_repo_id_cache(key)):
+        return cached
+    if auth_header():
+        repo_id = rest_get(org, project, f"git/repositories/{quote(repo)}")["id"]
+    else:
+        cmd = [
+            "az",
+            "repos",
+            "show",
+        ] + az_org_project_args(org, project) + [
+            "--repository",
+            repo,
+            "--query",
+            "id",
+            "-o",
+            "tsv",
+        ]
+        repo_id = run(cmd)
+    if use_cache and repo_id:
+        write_repo_id_cache(key, repo_id)
+    return repo_id
 
 
 def get_threads(
@@ -141,114 +242,69 @@ def get_threads(
     repo_id: str,
     pr_id: int,
 ) -> list[dict]:
-    cmd = [
-        "az",
-        "devops",
-        "invoke",
-    ] + az_org_project_args(org, None) + [
-        "--area",
-        "git",
-        "--resource",
-        "pullRequestThreads",
-        "--route-parameters",
-        f"project={project}",
-        f"repositoryId={repo_id}",
-        f"pullRequestId={pr_id}",
-        "-o",
-        "json",
-    ]
-    raw = run(cmd)
-    payload = json.loads(raw)
+    if auth_header():
+        payload = rest_get(
+            org, project, f"git/repositories/{repo_id}/pullRequests/{pr_id}/threads"
+        )
+    else:
+        cmd = [
+            "az",
+            "devops",
+            "invoke",
+        ] + az_org_project_args(org, None) + [
+            "--area",
+            "git",
+            "--resource",
+            "pullRequestThreads",
+            "--route-parameters",
+            f"project={project}",
+            f"repositoryId={repo_id}",
+            f"pullRequestId={pr_id}",
+            "-o",
+            "json",
+        ]
+        payload = loads(run_bytes(cmd))
     return payload.get("value", [])
 
 
-def get_pr_author(org: str | None, project: str, repo_id: str, pr_id: int) -> str | None:
-    cmd = [
-        "az",
-        "devops",
-        "invoke",
-    ] + az_org_project_args(org, None) + [
-        "--area",
-        "git",
-        "--resource",
-        "pullRequests",
-        "--route-parameters",
-        f"project={project}",
-        f"repositoryId={repo_id}",
-        f"pullRequestId={pr_id}",
-        "--query",
-        "createdBy.displayName",
-        "-o",
-        "tsv",
-    ]
-    author = run(cmd)
-    return author or None
-
-
-def get_pr_refs(
-    org: str | None,
-    project: str,
-    repo_id: str,
-    pr_id: int,
-) -> tuple[str | None, str | None]:
-    cmd = [
-        "az",
-        "devops",
-        "invoke",
-    ] + az_org_project_args(org, None) + [
-        "--area",
-        "git",
-        "--resource",
-        "pullRequests",
-        "--route-parameters",
-        f"project={project}",
-        f"repositoryId={repo_id}",
-        f"pullRequestId={pr_id}",
-        "--query",
-        "{source: sourceRefName, target: targetRefName}",
-        "-o",
-        "json",
-    ]
-    raw = run(cmd)
-    payload = json.loads(raw)
-    source_ref = payload.get("source")
-    target_ref = payload.get("target")
-    return source_ref, target_ref
-
-
-def get_pr_metadata(
+def get_pr_full(
     org: str | None,
     project: str,
     repo_id: str,
     pr_id: int,
-) -> tuple[str | None, str | None]:
-    cmd = [
-        "az",
-        "devops",
-        "invoke",
-    ] + az_org_project_args(org, None) + [
-        "--area",
-        "git",
-        "--resource",
-        "pullRequests",
-        "--route-parameters",
-        f"project={project}",
-        f"repositoryId={repo_id}",
-        f"pullRequestId={pr_id}",
-        "--query",
-        "{title: title, description: description}",
-        "-o",
-        "json",
-    ]
-    raw = run(cmd)
-    payload = json.loads(raw)
-    return payload.get("title"), payload.get("description")
+) -> dict:
+    if auth_header():
+        payload = rest_get(org, project, f"git/repositories/{repo_id}/pullRequests/{pr_id}")
+    else:
+        cmd = [
+            "az",
+            "devops",
+            "invoke",
+        ] + az_org_project_args(org, None) + [
+            "--area",
+            "git",
+            "--resource",
+            "pullRequests",
+            "--route-parameters",
+            f"project={project}",
+            f"repositoryId={repo_id}",
+            f"pullRequestId={pr_id}",
+            "-o",
+            "json",
+        ]
+        payload = loads(run_bytes(cmd))
+    return {
+        "author": (payload.get("createdBy") or {}).get("displayName"),
+        "source": payload.get("sourceRefName"),
+        "target": payload.get("targetRefName"),
+        "title": payload.get("title"),
+        "description": payload.get("description"),
+    }
 
 
 def prune_nulls(value: object) -> object:
     if isinstance(value, dict):
-        cleaned = {k: prune_nulls(v) for k, v in value.items() if v is not None}
-        return {k: v for k, v in cleaned.items() if v is not None}
+        return {k: prune_nulls(v) for k, v in value.items() if v is not None}
     if isinstance(value, list):
         return [prune_nulls(v) for v in value if v is not None]
     return value
@@ -262,6 +318,7 @@ def main() -> int:
     parser.add_argument("--org")
     parser.add_argument("--status", default="active")
     parser.add_argument("--file", help="Filter to a file path (ADO path)")
+    parser.add_argument("--no-cache", action="store_true", help="Skip the on-disk repo id cache.")
     args = parser.parse_args()
 
     org_remote, project_remote, repo_remote = infer_from_remote()
@@ -270,12 +327,16 @@ def main() -> int:
     repo = args.repo or repo_remote
     if not org or not project or not repo:
         raise SystemExit("Missing org/project/repo. Pass flags or set origin remote.")
+    # Resolve auth before the thread pool so the workers share one token lookup.
+    auth_header()
     pr_id = args.pr_id or find_pr_id(org, project, repo, args.status)
-    repo_id = get_repo_id(org, project, repo)
-    threads = get_threads(org, project, repo_id, pr_id)
+    repo_id = get_repo_id(org, project, repo, not args.no_cache)
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        threads_future = pool.submit(get_threads, org, project, repo_id, pr_id)
+        pr_future = pool.submit(get_pr_full, org, project, repo_id, pr_id)
+        threads = threads_future.result()
+        pr = pr_future.result()
 
-    source_ref, target_ref = get_pr_refs(org, project, repo_id, pr_id)
-    pr_title, pr_description = get_pr_metadata(org, project, repo_id, pr_id)
     items = []
     for thread in threads:
         ctx = thread.get("threadContext") or {}
@@ -304,14 +365,13 @@ def main() -> int:
             }
         )
 
-    pr_author = get_pr_author(org, project, repo_id, pr_id)
     output = {
         "prId": pr_id,
-        "prAuthor": pr_author,
-        "prBranch": source_ref,
-        "mergeBranch": target_ref,
-        "prTitle": pr_title,
-        "prDescription": pr_description,
+        "prAuthor": pr["author"],
+        "prBranch": pr["source"],
+        "mergeBranch": pr["target"],
+        "prTitle": pr["title"],
+        "prDescription": pr["description"],
         "threads": items,
     }
     print(json.dumps(prune_nulls(output), indent=2))
@@ -1,6 +1,7 @@
 #!/usr/bin/env -S uv run --script
 # /// script
 # requires-python = ">=3.11"
+# dependencies = ["httpx[http2]", "orjson"]
 # ///
 from __future__ import annotations
 
@@ -11,185 +12,382 @@ from __future__ import annotations
 
 Behavior:
   - Uses gh CLI to resolve repo + PR from current branch unless flags passed.
+  - Calls the GitHub API directly over HTTP/2 with the `gh auth token`; falls back to `gh api`.
+  - Uses the PR's host (GitHub Enterprise included) for the token and API base URL.
   - Filters to comments with file/line context; optional --file filter.
+  - Optional --since drops threads with no comments after that time.
   - Emits JSON with PR metadata and thread-like groups.
 """
 
 import argparse
-import json
-import subprocess
+import asyncio
+import contextlib
+import hashlib
+import os
+import re
+import shutil
+import sys
+import time
+from collections.abc import Awaitable
+from datetime import datetime, timezone
+from pathlib import Path
+from urllib.parse import urlencode, urlparse
+from urllib.request import getproxies, proxy_bypass
 
+import httpx
+from orjson import OPT_INDENT_2, dumps, loads
 
-def run(cmd: list[str]) -> str:
+
+# Resolve gh on PATH once instead of on every subprocess spawn.
+GH = shutil.which("gh") or "gh"
+GITHUB_API = "https://api.github.com"
+GITHUB_ACCEPT = "application/vnd.github+json"
+# Creation order lets build_threads group without re-sorting.
+COMMENTS_ORDER = {"sort": "created", "direction": "asc"}
+COMMENTS_PARAMS = {"per_page": 100, **COMMENTS_ORDER}
+COMMENTS_QUERY = urlencode(COMMENTS_ORDER)
+LAST_PAGE_RE = re.compile(r'[?&]page=(\d+)[^>]*>;\s*rel="last"')
+PR_VIEW_FIELDS = (
+    "number,url,title,body,author,headRefName,baseRefName,headRefOid,updatedAt"
+)
+COMMENTS_CACHE_DIR = Path.home() / ".cache" / "skillpack" / "gh-pr-comments"
+COMMENTS_CACHE_TTL = 10 * 60
+
+
+async def run_capture(cmd: list[str]) -> str:
+    return (await run_capture_bytes(cmd)).decode().strip()
+
+
+async def run_capture_bytes(cmd: list[str]) -> bytes:
     try:
-        result = subprocess.run(cmd, check=True, capture_output=True, text=True)
-    except subprocess.CalledProcessError as exc:
-        stdout = exc.stdout.strip()
-        stderr = exc.stderr.strip()
+        proc = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        stdout_b, stderr_b = await proc.communicate()
+    except Exception as exc:  # pragma: no cover - subprocess failures already handled below
+        raise SystemExit("command failed") from exc
+    if proc.returncode != 0:
+        stdout = stdout_b.decode(errors="replace").strip()
+        stderr = stderr_b.decode(errors="replace").strip()
         parts = []
         if stdout:
             parts.append(stdout)
         if stderr:
             parts.append(stderr)
         detail = "\n".join(parts) if parts else "command failed"
-        raise SystemExit(detail) from exc
-    return result.stdout.strip()
+        raise SystemExit(detail)
+    return stdout_b
 
 
-def get_repo(explicit_repo: str | None) -> str:
-    if explicit_repo:
-        return explicit_repo
-    repo = run(["gh", "repo", "view", "--json", "nameWithOwner", "-q", ".nameWithOwner"])
-    if not repo:
-        raise SystemExit("Missing repo. Pass --repo or set gh repo context.")
-    return repo
+def split_repo(repo: str) -> tuple[str, str]:
+    # gh accepts [HOST/]OWNER/REPO; without a host it uses GH_HOST or github.com.
+    parts = repo.split("/")
+    if len(parts) == 3:
+        return parts[0], f"{parts[1]}/{parts[2]}"
+    return os.environ.get("GH_HOST", "github.com"), repo
 
 
-def get_pr_number(pr_id: int | None) -> int:
+async def get_token(host: str) -> str:
+    try:
+        return await run_capture([GH, "auth", "token", "--hostname", host])
+    except SystemExit:
+        return ""
+
+
+def github_client(host: str, token: str) -> httpx.AsyncClient:
+    # GitHub Enterprise Server serves the REST API under /api/v3 on its own host.
+    base_url = GITHUB_API if host == "github.com" else f"https://{host}/api/v3"
+    # httpx ignores HTTPS_PROXY/NO_PROXY once a transport is passed, so resolve them here.
+    proxies = getproxies()
+    proxy = proxies.get("https") or proxies.get("all")
+    if proxy and proxy_bypass(urlparse(base_url).hostname):
+        proxy = None
+    return httpx.AsyncClient(
+        base_url=base_url,
+        headers={
+            "Authorization": f"Bearer {token}",
+            "Accept": GITHUB_ACCEPT,
+        },
+        transport=httpx.AsyncHTTPTransport(http2=True, retries=2, proxy=proxy),
+    )
+
+
+class ApiError(Exception):
+    """GitHub API failure; main turns it into SystemExit once gathered pages settle."""
+
+
+async def api_get(
+    client: httpx.AsyncClient, url: str, params: dict[str, int | str] | None = None
+) -> httpx.Response:
+    # SystemExit raised inside gathered tasks escapes the event loop with a traceback.
+    try:
+        resp = await client.get(url, params=params)
+    except httpx.HTTPError as exc:
+        raise ApiError(f"GET {url} failed: {exc}") from exc
+    if resp.status_code != 200:
+        raise ApiError(f"GET {url} failed ({resp.status_code})\n{resp.text}".strip())
+    return resp
+
+
+async def fetch_pr_metadata(client: httpx.AsyncClient, repo: str, pr_id: int) -> dict:
+    pr = loads((await api_get(client, f"/repos/{repo}/pulls/{pr_id}")).content)
+    return {
+        "number": pr["number"],
+        "url": pr.get("html_url"),
+        "title": pr.get("title"),
+        "body": pr.get("body"),
+        "author": {"login": (pr.get("user") or {}).get("login")},
+        "headRefName": pr["head"]["ref"],
+        "baseRefName": pr["base"]["ref"],
+        "headRefOid": pr["head"]["sha"],
+        "updatedAt": pr.get("updated_at"),
+        "reviewComments": pr.get("review_comments"),
+    }
+
+
+async def view_pr_metadata(repo: str | None, pr_id: int | None) -> dict:
+    # One `gh pr view` resolves the PR number, its host and repo (via url), and the metadata.
+    cmd = [GH, "pr", "view"]
     if pr_id:
-        return pr_id
-    pr = run(["gh", "pr", "view", "--json", "number", "-q", ".number"])
-    if not pr:
+        cmd += [str(pr_id)]
+        if repo:
+            cmd += ["--repo", repo]
+    cmd += ["--json", PR_VIEW_FIELDS]
+    metadata = loads(await run_capture_bytes(cmd))
+    if not metadata.get("number"):
         raise SystemExit("No PR found for current branch.")
-    return int(pr)
+    return metadata
 
 
-def get_pr_metadata(repo: str, pr_id: int) -> dict:
-    raw = run(
-        [
-            "gh",
-            "pr",
-            "view",
-            str(pr_id),
-            "--repo",
-            repo,
-            "--json",
-            "title,body,author,headRefName,baseRefName",
-        ]
-    )
-    return json.loads(raw)
+def repo_from_url(url: str) -> str:
+    owner, name = urlparse(url).path.strip("/").split("/")[:2]
+    return f"{owner}/{name}"
 
 
-def get_comments(repo: str, pr_id: int) -> list[dict]:
-    raw = run(
-        [
-            "gh",
-            "api",
-            f"repos/{repo}/pulls/{pr_id}/comments",
-            "--paginate",
-        ]
-    )
-    return json.loads(raw)
+def compact_comment(comment: dict) -> dict:
+    # REST comments carry diff hunks, links, and full user objects; keep only what threads use.
+    # Every key is always set (possibly None), so build_threads can index directly.
+    return {
+        "id": comment.get("id"),
+        "in_reply_to_id": comment.get("in_reply_to_id"),
+        "path": comment.get("path"),
+        "line": comment.get("line") or comment.get("original_line"),
+        "start_line": comment.get("start_line") or comment.get("original_start_line"),
+        "created_at": comment.get("created_at"),
+        "author": (comment.get("user") or {}).get("login"),
+        "body": comment.get("body"),
+    }
 
 
-def line_range(comment: dict) -> tuple[int | None, int | None]:
-    end = comment.get("line") or comment.get("original_line")
-    start = (
-        comment.get("start_line")
-        or comment.get("original_start_line")
-        or end
-    )
-    return start, end
+async def fetch_all_comments(
+    client: httpx.AsyncClient, repo: str, pr_id: int, total: int | None
+) -> list[dict]:
+    url = f"/repos/{repo}/pulls/{pr_id}/comments"
+
+    def get_page(page: int) -> Awaitable[httpx.Response]:
+        return api_get(client, url, {**COMMENTS_PARAMS, "page": page})
+
+    if total is not None:
+        # REST metadata carries the review comment count, so every page can be requested at
+        # once; the extra page at exact multiples of per_page comes back empty.
+        last_page = total // COMMENTS_PARAMS["per_page"] + 1
+        responses = await asyncio.gather(*(get_page(page) for page in range(1, last_page + 1)))
+    else:
+        first = await get_page(1)
+        match = LAST_PAGE_RE.search(first.headers.get("link", ""))
+        last_page = int(match.group(1)) if match else 1
+        rest = await asyncio.gather(*(get_page(page) for page in range(2, last_page + 1)))
+        responses = [first, *rest]
+    # The count can lag behind new comments; follow rel="next" past the expected last page.
+    while 'rel="next"' in responses[-1].headers.get("link", ""):
+        responses = [*responses, await get_page(len(responses) + 1)]
+    comments: list[dict] = []
+    for resp in responses:
+        comments.extend(map(compact_comment, loads(resp.content)))
+    return comments
+
 
+def comments_cache_path(host: str, repo: str, pr_id: int, metadata: dict) -> Path:
+    # New pushes change headRefOid and new review comments bump updatedAt.
+    key = f"{host}/{repo}|{pr_id}|{metadata.get('headRefOid')}|{metadata.get('updatedAt')}"
+    return COMMENTS_CACHE_DIR / f"{hashlib.sha1(key.encode()).hexdigest()}.json"
 
-def format_ref(path: str, start: int | None, end: int | None) -> str | None:
-    if not path or not start:
+
+def read_comments_cache(path: Path) -> list[dict] | None:
+    try:
+        if time.time() - path.stat().st_mtime > COMMENTS_CACHE_TTL:
+            return None
+        return loads(path.read_bytes())
+    except (OSError, ValueError):
         return None
-    if end and end != start:
-        return f"{path}#L{start}-L{end}"
-    return f"{path}#L{start}"
 
 
-def build_threads(comments: list[dict], file_filter: str | None) -> list[dict]:
-    by_id = {c.get("id"): c for c in comments if c.get("id")}
+def write_comments_cache(path: Path, comments: list[dict]) -> None:
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp.write_bytes(dumps(comments))
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+
+async def get_comments(
+    client: httpx.AsyncClient | None,
+    host: str,
+    repo: str,
+    pr_id: int,
+    metadata: dict,
+    use_cache: bool,
+) -> list[dict]:
+    cache_path = comments_cache_path(host, repo, pr_id, metadata)
+    if use_cache and (cached := read_comments_cache(cache_path)) is not None:
+        return cached
+    comments = await fetch_comments(client, host, repo, pr_id, metadata.get("reviewComments"))
+    if use_cache:
+        write_comments_cache(cache_path, comments)
+    return comments
+
+
+async def fetch_comments(
+    client: httpx.AsyncClient | None, host: str, repo: str, pr_id: int, total: int | None
+) -> list[dict]:
+    if client is not None:
+        return await fetch_all_comments(client, repo, pr_id, total)
+    raw = await run_capture_bytes(
+        [
+            GH,
+            "api",
+            "--hostname",
+            host,
+            f"repos/{repo}/pulls/{pr_id}/comments?{COMMENTS_QUERY}",
+            "--paginate",
+        ]
+    )
+    return [compact_comment(c) for c in loads(raw)]
+
+
+def build_threads(
+    comments: list[dict], file_filter: str | None, since: str | None
+) -> list[dict]:
+    if file_filter:
+        # Replies inherit their root's path, so filtering first keeps reply chains intact.
+        comments = [c for c in comments if c["path"] == file_filter]
+    by_id = {c["id"]: c for c in comments if c["id"]}
+    roots: dict[int, int] = {}
 
     def root_id(comment: dict) -> int | None:
-        current = comment.get("id")
-        parent = comment.get("in_reply_to_id")
-        while parent and parent in by_id:
+        current = comment["id"]
+        parent = comment["in_reply_to_id"]
+        path: list[int] = []
+        while parent and parent in by_id and current not in roots:
+            if current:
+                path.append(current)
             current = parent
-            parent = by_id[parent].get("in_reply_to_id")
-        return current
+            parent = by_id[parent]["in_reply_to_id"]
+        root = roots.get(current, current)
+        for cid in path:
+            roots[cid] = root
+        return root
 
-    groups: dict[int | None, list[dict]] = {}
+    # With --since, keep whole threads that have at least one newer comment.
+    active = (
+        {root_id(c) for c in comments if (c["created_at"] or "") > since} if since else None
+    )
+
+    # Build each thread in its output shape as comments arrive; no intermediate groups.
+    threads: dict[int | None, dict] = {}
     for comment in comments:
-        path = comment.get("path")
+        path = comment["path"]
         if not path:
             continue
-        if file_filter and path != file_filter:
-            continue
-        start, end = line_range(comment)
-        if not start and not end:
+        end = comment["line"]
+        start = comment["start_line"] or end
+        if not start:
             continue
         group_id = root_id(comment)
-        groups.setdefault(group_id, []).append(comment)
-
-    items: list[dict] = []
-    for group_comments in groups.values():
-        group_comments.sort(key=lambda c: c.get("created_at") or "")
-        location = next(
-            (
-                c
-                for c in group_comments
-                if format_ref(c.get("path"), *line_range(c))
-            ),
-            None,
-        )
-        if not location:
-            continue
-        ref = format_ref(location.get("path"), *line_range(location))
-        if not ref:
+        if active is not None and group_id not in active:
             continue
-        items.append(
+        if (thread := threads.get(group_id)) is None:
+            # The first comment in creation order anchors the ref.
+            ref = f"{path}#L{start}-L{end}" if end and end != start else f"{path}#L{start}"
+            thread = threads[group_id] = {"ref": ref, "comments": []}
+        thread["comments"].append(
+            # Omit missing fields here rather than pruning the finished output.
             {
-                "ref": ref,
-                "comments": [
-                    {
-                        "author": (c.get("user") or {}).get("login"),
-                        "posted": c.get("created_at"),
-                        "content": c.get("body"),
-                    }
-                    for c in group_comments
-                ],
+                key: value
+                for key, value in (
+                    ("author", comment["author"]),
+                    ("posted", comment["created_at"]),
+                    ("content", comment["body"]),
+                )
+                if value is not None
             }
         )
-    return items
+    return list(threads.values())
 
 
-def prune_nulls(value: object) -> object:
-    if isinstance(value, dict):
-        cleaned = {k: prune_nulls(v) for k, v in value.items() if v is not None}
-        return {k: v for k, v in cleaned.items() if v is not None}
-    if isinstance(value, list):
-        return [prune_nulls(v) for v in value if v is not None]
-    return value
+def utc_timestamp(value: str) -> str:
+    # Normalize to GitHub's created_at format so timestamps compare as strings.
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError as exc:
+        raise argparse.ArgumentTypeError(f"invalid ISO 8601 time: {value!r}") from exc
+    return parsed.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
 
 
-def main() -> int:
+async def main() -> int:
     parser = argparse.ArgumentParser(description="List PR review comments with file/line context.")
     parser.add_argument("--pr-id", type=int, help="PR number. If omitted, use current branch.")
-    parser.add_argument("--repo", help="Repo in owner/name form. If omitted, use gh context.")
+    parser.add_argument("--repo", help="Repo in [host/]owner/name form. If omitted, use gh context.")
     parser.add_argument("--file", help="Filter to a file path.")
+    parser.add_argument(
+        "--since",
+        type=utc_timestamp,
+        help="Only threads with comments after this ISO 8601 time (e.g. the last run).",
+    )
+    parser.add_argument("--no-cache", action="store_true", help="Skip the on-disk comment cache.")
     args = parser.parse_args()
 
-    repo = get_repo(args.repo)
-    pr_id = get_pr_number(args.pr_id)
-    metadata = get_pr_metadata(repo, pr_id)
-    comments = get_comments(repo, pr_id)
-    threads = build_threads(comments, args.file)
-
-    output = {
-        "prId": pr_id,
-        "prAuthor": (metadata.get("author") or {}).get("login"),
-        "prBranch": metadata.get("headRefName"),
-        "mergeBranch": metadata.get("baseRefName"),
-        "prTitle": metadata.get("title"),
-        "prDescription": metadata.get("body"),
-        "threads": threads,
-    }
-    print(json.dumps(prune_nulls(output), indent=2))
+    metadata: dict | None = None
+    if args.repo and args.pr_id:
+        host, repo = split_repo(args.repo)
+        pr_id = args.pr_id
+    else:
+        # The PR url names the host, so GitHub Enterprise repos get the right API and token.
+        metadata = await view_pr_metadata(args.repo, args.pr_id)
+        host = urlparse(metadata["url"]).netloc
+        repo = repo_from_url(metadata["url"])
+        pr_id = metadata["number"]
+    token = await get_token(host)
+    try:
+        async with github_client(host, token) if token else contextlib.nullcontext() as client:
+            # The comment cache is keyed on head commit and update time, so metadata comes first.
+            if metadata is None and client is not None:
+                metadata = await fetch_pr_metadata(client, repo, pr_id)
+            elif metadata is None:
+                metadata = await view_pr_metadata(args.repo, pr_id)
+            comments = await get_comments(client, host, repo, pr_id, metadata, not args.no_cache)
+    except ApiError as exc:
+        raise SystemExit(str(exc)) from None
+    threads = build_threads(comments, args.file, args.since)
+
+    output: dict[str, object] = {"prId": pr_id}
+    for key, value in (
+        ("prAuthor", (metadata.get("author") or {}).get("login")),
+        ("prBranch", metadata.get("headRefName")),
+        ("mergeBranch", metadata.get("baseRefName")),
+        ("prTitle", metadata.get("title")),
+        ("prDescription", metadata.get("body")),
+    ):
+        if value is not None:
+            output[key] = value
+    output["threads"] = threads
+    sys.stdout.buffer.write(dumps(output, option=OPT_INDENT_2) + b"\n")
     return 0
 
 
 if __name__ == "__main__":
-    raise SystemExit(main())
+    raise SystemExit(asyncio.run(main()))